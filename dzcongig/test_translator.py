@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Потоковая трансляция (по умолчанию) и путь через AST (--keep-ast) должны
+# давать одинаковый TOML и одинаковые сообщения об ошибках.
+# Запуск: python -m unittest discover -s dzcongig
+
+import contextlib
+import io
+import os
+import random
+import stat
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import translator
+from translator import EvalError, LexerError, ParseError, run_cli, translate
+
+def run(src, keep_ast):
+    try:
+        return ("ok", translate(src, keep_ast=keep_ast))
+    except (LexerError, ParseError, EvalError) as e:
+        return (type(e).__name__, str(e))
+
+# --------- Примеры с известным результатом ---------
+
+EXPECTED = {
+    # числа
+    "0x1F": "value = 31\n",
+    "0XaBc": "value = 2748\n",
+    "{ big = 0xFFFFFFFFFFFFFFFFFFFF; }": "big = 1208925819614629174706175\n",
+    # массивы
+    "array()": "value = []\n",
+    "array(0x1, array(0x2, 0x3), array())": "value = [1, [2, 3], []]\n",
+    # словари
+    "{}": "",
+    "{ a = 0x1; b = {}; c = { d = array(0x2); }; }": "a = 1\nb = {  }\nc = { d = [2] }\n",
+    "array({ a = 0x1; }, {})": "value = [{ a = 1 }, {  }]\n",
+    # повторный ключ: место первого вхождения, значение последнего
+    "{ a = 0x1; b = 0x2; a = 0x3; }": "a = 3\nb = 2\n",
+    "{ m = { x = 0x1; y = 0x2; x = array(0x3); }; }": "m = { x = [3], y = 2 }\n",
+    "{ m = { x = 0x1; x = 0x2; x = 0x3; }; n = 0x0; }": "m = { x = 3 }\nn = 0\n",
+    # константы
+    "var A = 0x10\n{ a = ?[A]; }": "a = 16\n",
+    "var A = array(0x1)\nvar B = array(?[A], ?[A])\n{ b = ?[B]; }": "b = [[1], [1]]\n",
+    "var A = { x = 0x1; }\nvar B = ?[A]\n{ a = ?[A]; b = array(?[B]); }": "a = { x = 1 }\nb = [{ x = 1 }]\n",
+    "var A = { x = 0x1; x = 0x2; }\n{ a = ?[A]; }": "a = { x = 2 }\n",
+    # константа в корне
+    "var A = 0x5\n?[A]": "value = 5\n",
+    "var A = array(0x5)\n?[A]": "value = [5]\n",
+    "var D = { k = 0x1; m = { n = 0x2; }; k = 0x3; }\n?[D]": "k = 3\nm = { n = 2 }\n",
+    "var D = { k = 0x1; }\nvar E = ?[D]\n?[E]": "k = 1\n",
+    "var D = {}\n?[D]": "",
+}
+
+ERRORS = {
+    # синтаксические ошибки
+    "": ("ParseError", "Ожидалось значение на 1:1, найдено 'EOF'"),
+    "{\n a = 0x1\n}": ("ParseError", "Ожидалось ';' на 3:1, найдено '}'"),
+    "{ a = 0x1; } }": ("ParseError", "Ожидалось 'EOF' на 1:14, найдено '}'"),
+    "{ var = 0x1; }": ("ParseError", "Ожидалось 'IDENT' на 1:3, найдено 'var'"),
+    "{\n  a = 0x1;\n  b = @;\n}": ("LexerError", "Неожиданный символ '@' на позиции 3:7"),
+    "{ a = 0x; }": ("LexerError", "После 0x ожидались hex-цифры на позиции 1:9"),
+    # ошибки констант
+    "{ a = ?[Nope]; }": ("EvalError", "Неизвестная константа '?[Nope]'"),
+    "var A = 0x1\nvar A = 0x2\n{}": ("EvalError", "Повторное объявление константы 'A'"),
+    "var A = ?[B]\nvar B = 0x1\n{}": ("EvalError", "Неизвестная константа '?[B]'"),
+    "?[Nope]": ("EvalError", "Неизвестная константа '?[Nope]'"),
+    # порядок: первая по тексту ошибка констант
+    "{ a = array(array(?[X]), ?[Y]); }": ("EvalError", "Неизвестная константа '?[X]'"),
+    "var A = 0x1\nvar A = ?[X]\n{}": ("EvalError", "Повторное объявление константы 'A'"),
+    "var A = ?[X]\nvar A = 0x1\n{}": ("EvalError", "Неизвестная константа '?[X]'"),
+    # порядок: синтаксическая ошибка важнее ошибки констант, даже если она дальше
+    "{ a = ?[X]; b = ; }": ("ParseError", "Ожидалось значение на 1:17, найдено ';'"),
+    "var A = 0x1\nvar A = 0x2\n{ a = 0x1 }": ("ParseError", "Ожидалось ';' на 3:11, найдено '}'"),
+}
+
+class KnownResultsTest(unittest.TestCase):
+    def test_output(self):
+        for src, expected in EXPECTED.items():
+            for keep_ast in (False, True):
+                with self.subTest(src=src, keep_ast=keep_ast):
+                    self.assertEqual(run(src, keep_ast), ("ok", expected))
+
+    def test_errors(self):
+        for src, expected in ERRORS.items():
+            for keep_ast in (False, True):
+                with self.subTest(src=src, keep_ast=keep_ast):
+                    self.assertEqual(run(src, keep_ast), expected)
+
+# --------- Сравнение путей на случайных программах ---------
+
+KEYS = ["a", "b", "c"]
+
+def random_value(rnd, depth, names):
+    r = rnd.random()
+    if depth > 3 or r < 0.3:
+        return rnd.choice(["0x1", "0xff", "0x100", "0X0"])
+    if r < 0.5:
+        items = (random_value(rnd, depth + 1, names) for _ in range(rnd.randint(0, 3)))
+        return "array(" + ", ".join(items) + ")"
+    if r < 0.75:
+        items = (f"{rnd.choice(KEYS)} = {random_value(rnd, depth + 1, names)};" for _ in range(rnd.randint(0, 4)))
+        return "{ " + " ".join(items) + " }"
+    pool = names + ["Zz"] if rnd.random() < 0.1 else names
+    return f"?[{rnd.choice(pool)}]" if pool else "0x2"
+
+def random_program(rnd):
+    names = []
+    lines = []
+    for i in range(rnd.randint(0, 4)):
+        # иногда повторяем имя, чтобы получить повторное объявление
+        name = rnd.choice(["A", "B", "C"]) if rnd.random() < 0.15 else f"N{i}"
+        lines.append(f"var {name} = {random_value(rnd, 0, names)}")
+        names.append(name)
+    lines.append(random_value(rnd, 0, names))
+    src = "\n".join(lines)
+    if rnd.random() < 0.1:
+        # случайная порча текста — синтаксические и лексические ошибки
+        i = rnd.randrange(len(src) + 1)
+        src = src[:i] + rnd.choice([";", "}", "@", "", "0x"]) + src[i:]
+    return src
+
+class StreamMatchesAstTest(unittest.TestCase):
+    def test_random_programs(self):
+        rnd = random.Random(2024)
+        for _ in range(3000):
+            src = random_program(rnd)
+            with self.subTest(src=src):
+                self.assertEqual(run(src, False), run(src, True))
+
+# --------- Командная строка ---------
+
+class CliTestCase(unittest.TestCase):
+    # временный каталог для файлов и кэша: XDG_CACHE_HOME указывает внутрь него
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        env = mock.patch.dict(os.environ, {"XDG_CACHE_HOME": str(self.dir / "cache")})
+        env.start()
+        self.addCleanup(env.stop)
+        self.cache = self.dir / "cache" / "dzconfig"
+
+    def cli(self, data, *flags):
+        # возвращает (код возврата, stderr, выходной файл или None)
+        src = self.dir / "input.conf"
+        out = self.dir / "output.toml"
+        src.write_bytes(data.encode("utf-8"))
+        if out.exists():
+            out.unlink()
+        err = io.StringIO()
+        with contextlib.redirect_stderr(err):
+            code = run_cli(["-i", str(src), "-o", str(out), *flags])
+        text = out.read_text(encoding="utf-8") if out.exists() else None
+        return code, err.getvalue(), text
+
+class NewlinesTest(CliTestCase):
+    def test_error_position_does_not_depend_on_line_breaks(self):
+        src = "{\n  a = 0x1;\n  b = @;\n}"
+        expected = "Синтаксическая ошибка: Неожиданный символ '@' на позиции 3:7\n"
+        for newline in ("\n", "\r\n", "\r"):
+            with self.subTest(newline=repr(newline)):
+                code, err, _ = self.cli(src.replace("\n", newline), "--no-cache")
+                self.assertEqual((code, err), (1, expected))
+
+class CacheTest(CliTestCase):
+    SRC = "var A = 0x1\n{ a = ?[A]; }"
+
+    def entries(self):
+        return sorted(self.cache.glob("*.toml")) if self.cache.is_dir() else []
+
+    def cli_counting(self, data, *flags):
+        # (код, stderr, вывод, число вызовов translate)
+        with mock.patch("translator.translate", wraps=translate) as spy:
+            result = self.cli(data, *flags)
+        return (*result, spy.call_count)
+
+    def test_miss_then_hit(self):
+        self.assertEqual(self.cli_counting(self.SRC), (0, "", "a = 1\n", 1))
+        self.assertEqual(self.cli_counting(self.SRC), (0, "", "a = 1\n", 0))
+        [entry] = self.entries()
+        if hasattr(os, "getuid"):
+            self.assertEqual(stat.S_IMODE(entry.stat().st_mode), 0o600)
+            self.assertEqual(stat.S_IMODE(self.cache.stat().st_mode), 0o700)
+
+    def test_no_cache_neither_reads_nor_writes(self):
+        self.assertEqual(self.cli_counting(self.SRC, "--no-cache")[3], 1)
+        self.assertEqual(self.entries(), [])
+        self.cli(self.SRC)
+        [entry] = self.entries()
+        entry.write_text("stale = 1\n", encoding="utf-8")
+        self.assertEqual(self.cli_counting(self.SRC, "--no-cache"), (0, "", "a = 1\n", 1))
+        self.assertEqual(entry.read_text(encoding="utf-8"), "stale = 1\n")
+
+    def test_keep_ast_bypasses_cache(self):
+        self.cli(self.SRC)
+        [entry] = self.entries()
+        entry.write_text("stale = 1\n", encoding="utf-8")
+        original = translator.Parser.parse_program
+        with mock.patch.object(translator.Parser, "parse_program", autospec=True, side_effect=original) as spy:
+            result = self.cli(self.SRC, "--keep-ast")
+        self.assertEqual(result, (0, "", "a = 1\n"))
+        self.assertEqual(spy.call_count, 1)
+        self.assertEqual(self.entries(), [entry])
+        self.assertEqual(entry.read_text(encoding="utf-8"), "stale = 1\n")
+
+    def test_failed_translation_is_not_cached(self):
+        code, _, out = self.cli("{ a = ; }")
+        self.assertEqual((code, out), (1, None))
+        self.assertEqual(self.entries(), [])
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "права доступа POSIX")
+    def test_group_writable_dir_is_tightened(self):
+        self.cache.mkdir(parents=True)
+        os.chmod(self.cache, 0o770)
+        self.assertEqual(self.cli(self.SRC)[0], 0)
+        self.assertEqual(stat.S_IMODE(self.cache.stat().st_mode), 0o700)
+        self.assertEqual(len(self.entries()), 1)
+
+    def test_symlinked_dir_is_ignored(self):
+        target = self.dir / "elsewhere"
+        target.mkdir(mode=0o700)
+        self.cache.parent.mkdir()
+        try:
+            os.symlink(target, self.cache, target_is_directory=True)
+        except (OSError, NotImplementedError):
+            self.skipTest("символические ссылки недоступны")
+        for _ in range(2):
+            self.assertEqual(self.cli_counting(self.SRC), (0, "", "a = 1\n", 1))
+        self.assertEqual(list(target.iterdir()), [])
+
+    def test_oldest_entries_are_evicted(self):
+        seen = set()
+        with mock.patch("translator.CACHE_MAX_ENTRIES", 2):
+            for i in range(3):
+                self.cli(f"{{ a = 0x{i}; }}")
+                # явные, строго возрастающие времена использования
+                [entry] = [e for e in self.entries() if e.name not in seen]
+                os.utime(entry, (1000 + i, 1000 + i))
+                seen.add(entry.name)
+            self.assertEqual(len(self.entries()), 2)
+            self.assertEqual(self.cli_counting("{ a = 0x0; }")[3], 1)
+            self.assertEqual(self.cli_counting("{ a = 0x2; }")[3], 0)
+
+if __name__ == "__main__":
+    unittest.main()
\ No newline at end of file
@@ -2,7 +2,14 @@
 # coding: utf-8
 
 import argparse
+import hashlib
+import os
+import re
+import stat
 import sys
+from array import array
+from collections import namedtuple
+from pathlib import Path
 
 # --------- Лексер ---------
 
@@ -23,155 +30,164 @@ class TokenKind:
     RBRACKET = "]"
     EOF = "EOF"
 
-class Token:
-    def __init__(self, kind, value, line, col):
-        self.kind = kind
-        self.value = value
-        self.line = line
-        self.col = col
+# токены хранятся столбцами: kinds[i], values[i], offsets[i] (смещение в text);
+# строка и столбец вычисляются из смещения только для сообщений об ошибках
+Tokens = namedtuple("Tokens", ["kinds", "values", "offsets", "text"])
+
+def line_col(text, pos):
+    line_start = text.rfind("\n", 0, pos) + 1
+    return text.count("\n", 0, pos) + 1, pos - line_start + 1
 
 class LexerError(Exception):
     pass
 
+TOKEN_RE = re.compile(
+    r"(?P<WS>\s+)"
+    r"|(?P<HEX>0[xX][0-9a-fA-F]+)"
+    r"|(?P<IDENT>[A-Za-z][A-Za-z0-9]*)"
+    r"|(?P<PUNCT>[{};=(),?\[\]])"
+)
+
+KEYWORDS = {
+    "array": TokenKind.KW_ARRAY,
+    "var": TokenKind.KW_VAR,
+}
+
+PUNCT_KINDS = {
+    "{": TokenKind.LBRACE,
+    "}": TokenKind.RBRACE,
+    ";": TokenKind.SEMI,
+    "=": TokenKind.EQUAL,
+    "(": TokenKind.LPAREN,
+    ")": TokenKind.RPAREN,
+    ",": TokenKind.COMMA,
+    "?": TokenKind.QMARK,
+    "[": TokenKind.LBRACKET,
+    "]": TokenKind.RBRACKET,
+}
+
+# вид токена по коду символа: TOKEN_RE пропускает в группу PUNCT только ASCII
+PUNCT_TABLE = [None] * 128
+for _ch, _kind in PUNCT_KINDS.items():
+    PUNCT_TABLE[ord(_ch)] = _kind
+del _ch, _kind
+
+# номера групп TOKEN_RE: m.lastindex сравнивается как целое, без строк имён
+WS_GROUP = TOKEN_RE.groupindex["WS"]
+HEX_GROUP = TOKEN_RE.groupindex["HEX"]
+IDENT_GROUP = TOKEN_RE.groupindex["IDENT"]
+
 class Lexer:
     def __init__(self, text):
         self.text = text
-        self.i = 0
-        self.line = 1
-        self.col = 1
-
-    def peek(self, n=1):
-        pos = self.i + n - 1
-        if pos >= len(self.text):
-            return ""
-        return self.text[pos]
-
-    def advance(self, n=1):
-        for _ in range(n):
-            if self.i >= len(self.text):
-                return
-            ch = self.text[self.i]
-            self.i += 1
-            if ch == "\n":
-                self.line += 1
-                self.col = 1
-            else:
-                self.col += 1
 
-    def skip_ws(self):
-        while True:
-            ch = self.peek()
-            if ch and ch.isspace():
-                self.advance()
-            else:
-                break
-
-    def lex_ident_or_kw(self):
-        start_line, start_col = self.line, self.col
-        s = []
-        ch = self.peek()
-        if not ch or not ch.isalpha():
-            raise LexerError(f"Ожидалось имя на позиции {self.line}:{self.col}")
-        while True:
-            ch = self.peek()
-            if ch and ch.isalnum():
-                s.append(ch)
-                self.advance()
-            else:
-                break
-        word = "".join(s)
-        if word == "array":
-            return Token(TokenKind.KW_ARRAY, word, start_line, start_col)
-        if word == "var":
-            return Token(TokenKind.KW_VAR, word, start_line, start_col)
-        return Token(TokenKind.IDENT, word, start_line, start_col)
-
-    def lex_hex(self):
-        start_line, start_col = self.line, self.col
-        if self.peek() != "0" or self.peek(2).lower() != "x":
-            raise LexerError(f"Ожидалось hex число 0x... на позиции {self.line}:{self.col}")
-        self.advance(2)
-        digits = []
-        while True:
-            ch = self.peek()
-            if ch and (ch.isdigit() or ch.lower() in "abcdef"):
-                digits.append(ch)
-                self.advance()
+    def error_at(self, pos):
+        text = self.text
+        line, col = line_col(text, pos)
+        if text.startswith(("0x", "0X"), pos):
+            return LexerError(f"После 0x ожидались hex-цифры на позиции {line}:{col + 2}")
+        return LexerError(f"Неожиданный символ '{text[pos]}' на позиции {line}:{col}")
+
+    def scan(self):
+        # первый проход: только виды токенов и их границы, без объектов Token.
+        # Атрибуты и методы, нужные в цикле, заранее связаны с локальными именами.
+        kinds = []
+        starts = array("i")
+        ends = array("i")
+        add_kind = kinds.append
+        add_start = starts.append
+        add_end = ends.append
+        keyword = KEYWORDS.get
+        punct = PUNCT_TABLE
+        hex_kind = TokenKind.HEX
+        ident_kind = TokenKind.IDENT
+        ws_group, hex_group, ident_group = WS_GROUP, HEX_GROUP, IDENT_GROUP
+        text = self.text
+        pos = 0
+        for m in TOKEN_RE.finditer(text):
+            start, end = m.span()
+            if start != pos:
+                raise self.error_at(pos)
+            pos = end
+            group = m.lastindex
+            if group == ws_group:
+                continue
+            if group == hex_group:
+                add_kind(hex_kind)
+            elif group == ident_group:
+                add_kind(keyword(m.group(), ident_kind))
             else:
-                break
-        if not digits:
-            raise LexerError(f"После 0x ожидались hex-цифры на позиции {self.line}:{self.col}")
-        return Token(TokenKind.HEX, "".join(digits), start_line, start_col)
-
-    def next_token(self):
-        self.skip_ws()
-        ch = self.peek()
-        if ch == "":
-            return Token(TokenKind.EOF, None, self.line, self.col)
-
-        single = {
-            "{": TokenKind.LBRACE,
-            "}": TokenKind.RBRACE,
-            ";": TokenKind.SEMI,
-            "=": TokenKind.EQUAL,
-            "(": TokenKind.LPAREN,
-            ")": TokenKind.RPAREN,
-            ",": TokenKind.COMMA,
-            "?": TokenKind.QMARK,
-            "[": TokenKind.LBRACKET,
-            "]": TokenKind.RBRACKET,
-        }
-        if ch in single:
-            tok = Token(single[ch], ch, self.line, self.col)
-            self.advance()
-            return tok
-
-        if ch == "0" and self.peek(2).lower() == "x":
-            return self.lex_hex()
-
-        if ch.isalpha():
-            return self.lex_ident_or_kw()
-
-        raise LexerError(f"Неожиданный символ '{ch}' на позиции {self.line}:{self.col}")
+                add_kind(punct[ord(text[start])])
+            add_start(start)
+            add_end(end)
+        if pos != len(text):
+            raise self.error_at(pos)
+        add_kind(TokenKind.EOF)
+        add_start(pos)
+        add_end(pos)
+        return kinds, starts, ends
 
     def tokenize(self):
-        tokens = []
-        while True:
-            tok = self.next_token()
-            tokens.append(tok)
-            if tok.kind == TokenKind.EOF:
-                break
-        return tokens
+        kinds, starts, ends = self.scan()
+        text = self.text
+        values = []
+        add_value = values.append
+        intern = sys.intern
+        hex_kind = TokenKind.HEX
+        ident_kind = TokenKind.IDENT
+        for kind, start, end in zip(kinds, starts, ends):
+            # у пунктуации, ключевых слов и EOF значение однозначно задаётся видом
+            if kind == hex_kind:
+                add_value(int(text[start + 2:end], 16))
+            elif kind == ident_kind:
+                add_value(intern(text[start:end]))
+            else:
+                add_value(None)
+        return Tokens(kinds, values, starts, text)
 
 # --------- AST (без конфликтов имён) ---------
 
 class NumberNode:
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
 
 class ArrayNode:
+    __slots__ = ("items",)
+
     def __init__(self, items):
         self.items = items
 
 class DictItemNode:
+    __slots__ = ("key", "value")
+
     def __init__(self, key, value):
         self.key = key
         self.value = value
 
 class MapNode:
+    __slots__ = ("items",)
+
     def __init__(self, items):
         self.items = items  # list of DictItemNode
 
 class ConstRefNode:
+    __slots__ = ("name",)
+
     def __init__(self, name):
         self.name = name
 
 class ConstDeclNode:
+    __slots__ = ("name", "value")
+
     def __init__(self, name, value):
         self.name = name
         self.value = value
 
 class ProgramNode:
+    __slots__ = ("consts", "root")
+
     def __init__(self, consts, root):
         self.consts = consts
         self.root = root
@@ -181,180 +197,585 @@ class ProgramNode:
 class ParseError(Exception):
     pass
 
-class Parser:
+class TokenReader:
+    # общий курсор по столбцам токенов для Parser и StreamTranslator
     def __init__(self, tokens):
-        self.tokens = tokens
+        self.kinds = tokens.kinds
+        self.values = tokens.values
+        self.offsets = tokens.offsets
+        self.text = tokens.text
         self.i = 0
 
+    def location(self, i):
+        line, col = line_col(self.text, self.offsets[i])
+        return f"{line}:{col}"
+
     def peek(self):
-        return self.tokens[self.i]
+        return self.kinds[self.i]
 
     def advance(self):
-        tok = self.tokens[self.i]
+        value = self.values[self.i]
         self.i += 1
-        return tok
+        return value
 
     def expect(self, kind):
-        tok = self.peek()
-        if tok.kind != kind:
-            raise ParseError(f"Ожидалось '{kind}' на {tok.line}:{tok.col}, найдено '{tok.kind}'")
+        i = self.i
+        if self.kinds[i] != kind:
+            raise ParseError(f"Ожидалось '{kind}' на {self.location(i)}, найдено '{self.kinds[i]}'")
         return self.advance()
 
+def _make_expect(kind):
+    def expect(self):
+        i = self.i
+        if self.kinds[i] != kind:
+            self.expect(kind)  # общий путь формирует сообщение об ошибке
+        self.i = i + 1
+        return self.values[i]
+    return expect
+
+# TokenReader.expect_LBRACE(), TokenReader.expect_IDENT(), ... — по методу на каждый вид токена
+for _name, _kind in vars(TokenKind).items():
+    if not _name.startswith("_"):
+        setattr(TokenReader, f"expect_{_name}", _make_expect(_kind))
+del _name, _kind
+
+class Parser(TokenReader):
     def parse_program(self):
         consts = []
-        while self.peek().kind == TokenKind.KW_VAR:
+        while self.peek() == TokenKind.KW_VAR:
             consts.append(self.parse_const_decl())
         root = self.parse_value()
-        self.expect(TokenKind.EOF)
+        self.expect_EOF()
         return ProgramNode(consts, root)
 
     def parse_const_decl(self):
-        self.expect(TokenKind.KW_VAR)
-        ident = self.expect(TokenKind.IDENT)
-        self.expect(TokenKind.EQUAL)
+        self.expect_KW_VAR()
+        name = self.expect_IDENT()
+        self.expect_EQUAL()
         val = self.parse_value()
-        return ConstDeclNode(ident.value, val)
+        return ConstDeclNode(name, val)
 
     def parse_value(self):
-        t = self.peek()
-        if t.kind == TokenKind.HEX:
-            tok = self.advance()
-            return NumberNode(int(tok.value, 16))
-        if t.kind == TokenKind.KW_ARRAY:
+        kind = self.peek()
+        if kind == TokenKind.HEX:
+            return NumberNode(self.advance())
+        if kind == TokenKind.KW_ARRAY:
             return self.parse_array()
-        if t.kind == TokenKind.LBRACE:
+        if kind == TokenKind.LBRACE:
             return self.parse_dict()
-        if t.kind == TokenKind.QMARK:
+        if kind == TokenKind.QMARK:
             return self.parse_const_ref()
-        raise ParseError(f"Ожидалось значение на {t.line}:{t.col}, найдено '{t.kind}'")
+        i = self.i
+        raise ParseError(f"Ожидалось значение на {self.location(i)}, найдено '{kind}'")
 
     def parse_array(self):
-        self.expect(TokenKind.KW_ARRAY)
-        self.expect(TokenKind.LPAREN)
+        self.expect_KW_ARRAY()
+        self.expect_LPAREN()
         items = []
-        if self.peek().kind != TokenKind.RPAREN:
+        if self.peek() != TokenKind.RPAREN:
             items.append(self.parse_value())
-            while self.peek().kind == TokenKind.COMMA:
+            while self.peek() == TokenKind.COMMA:
                 self.advance()
                 items.append(self.parse_value())
-        self.expect(TokenKind.RPAREN)
+        self.expect_RPAREN()
         return ArrayNode(items)
 
     def parse_dict(self):
-        self.expect(TokenKind.LBRACE)
+        self.expect_LBRACE()
         items = []
-        while self.peek().kind != TokenKind.RBRACE:
-            key_tok = self.expect(TokenKind.IDENT)
-            self.expect(TokenKind.EQUAL)
+        while self.peek() != TokenKind.RBRACE:
+            key = self.expect_IDENT()
+            self.expect_EQUAL()
             val = self.parse_value()
-            self.expect(TokenKind.SEMI)
-            items.append(DictItemNode(key_tok.value, val))
-        self.expect(TokenKind.RBRACE)
+            self.expect_SEMI()
+            items.append(DictItemNode(key, val))
+        self.expect_RBRACE()
         return MapNode(items)
 
     def parse_const_ref(self):
-        self.expect(TokenKind.QMARK)
-        self.expect(TokenKind.LBRACKET)
-        name_tok = self.expect(TokenKind.IDENT)
-        self.expect(TokenKind.RBRACKET)
-        return ConstRefNode(name_tok.value)
+        self.expect_QMARK()
+        self.expect_LBRACKET()
+        name = self.expect_IDENT()
+        self.expect_RBRACKET()
+        return ConstRefNode(name)
 
 # --------- Вычисление ---------
 
 class EvalError(Exception):
     pass
 
+# метки записей явного стека обхода (вместо рекурсии)
+VISIT = 0
+BUILD_ARRAY = 1
+BUILD_MAP = 2
+TEXT = 3
+
+def fold_consts(prog):
+    # подставляет вместо ?[имя] сам узел значения константы (общая ссылка),
+    # так что после свёртки в дереве не остаётся ConstRefNode
+    consts = {}
+    for decl in prog.consts:
+        if decl.name in consts:
+            raise EvalError(f"Повторное объявление константы '{decl.name}'")
+        decl.value = _fold_value(decl.value, consts)
+        consts[decl.name] = decl.value
+    prog.root = _fold_value(prog.root, consts)
+    return prog
+
+def _fold_value(v, consts):
+    holder = [v]
+    # записи стека: (список, индекс) или (DictItemNode, None) — где лежит узел
+    stack = [(holder, 0)]
+    while stack:
+        owner, j = stack.pop()
+        node = owner.value if j is None else owner[j]
+        kind = type(node)
+        if kind is ConstRefNode:
+            if node.name not in consts:
+                raise EvalError(f"Неизвестная константа '?[{node.name}]'")
+            # узлы констант уже свёрнуты, повторно в них не спускаемся
+            if j is None:
+                owner.value = consts[node.name]
+            else:
+                owner[j] = consts[node.name]
+        elif kind is ArrayNode:
+            items = node.items
+            stack.extend((items, k) for k in range(len(items) - 1, -1, -1))
+        elif kind is MapNode:
+            stack.extend((item, None) for item in reversed(node.items))
+    return holder[0]
+
+class _ConstStrRef:
+    # значение константы вместе с его готовой строкой TOML:
+    # при генерации строка пишется как есть, без повторного обхода
+    __slots__ = ("value", "text")
+
+    def __init__(self, value, text):
+        self.value = value
+        self.text = text
+
 class Evaluator:
+    # принимает дерево после fold_consts: ConstRefNode в нём уже нет, а ссылки
+    # на константу — это общий узел её значения
     def __init__(self):
-        self.consts = {}
+        # id(узел-контейнер) -> (узел, значение). Узел хранится, чтобы id не
+        # переиспользовался. Общие поддеревья (свёрнутые константы) дают один и
+        # тот же объект list/dict — при генерации TOML он только читается.
+        self.memo = {}
 
     def eval_program(self, prog):
         for decl in prog.consts:
-            if decl.name in self.consts:
-                raise EvalError(f"Повторное объявление константы '{decl.name}'")
             val = self.eval_value(decl.value)
-            self.consts[decl.name] = val
+            # var B = ?[A]: после свёртки это тот же узел, строка уже готова
+            if type(val) is not _ConstStrRef:
+                # строка TOML константы строится один раз и пишется во все места ссылок
+                self.memo[id(decl.value)] = (decl.value, _ConstStrRef(val, emit_value(val)))
         return self.eval_value(prog.root)
 
     def eval_value(self, v):
-        if isinstance(v, NumberNode):
-            return v.value
-        if isinstance(v, ArrayNode):
-            return [self.eval_value(item) for item in v.items]
-        if isinstance(v, MapNode):
-            result = {}
-            for item in v.items:
-                result[item.key] = self.eval_value(item.value)
-            return result
-        if isinstance(v, ConstRefNode):
-            if v.name not in self.consts:
-                raise EvalError(f"Неизвестная константа '?[{v.name}]'")
-            return self.consts[v.name]
-        raise EvalError("Неизвестный тип значения")
+        memo = self.memo
+        stack = [(VISIT, v)]
+        results = []
+        while stack:
+            op, node = stack.pop()
+            if op == VISIT:
+                hit = memo.get(id(node))
+                if hit is not None and hit[0] is node:
+                    results.append(hit[1])
+                    continue
+                try:
+                    handler = EVAL_DISPATCH[type(node)]
+                except KeyError:
+                    raise EvalError("Неизвестный тип значения") from None
+                handler(self, node, stack, results)
+                continue
+            # значения детей лежат последними на стеке результатов, в исходном порядке
+            base = len(results) - len(node.items)
+            values = results[base:]
+            del results[base:]
+            if op == BUILD_MAP:
+                values = {item.key: val for item, val in zip(node.items, values)}
+            memo[id(node)] = (node, values)
+            results.append(values)
+        return results[0]
+
+    def _eval_num(self, node, stack, results):
+        results.append(node.value)
+
+    def _eval_arr(self, node, stack, results):
+        stack.append((BUILD_ARRAY, node))
+        stack.extend((VISIT, item) for item in reversed(node.items))
+
+    def _eval_map(self, node, stack, results):
+        stack.append((BUILD_MAP, node))
+        stack.extend((VISIT, item.value) for item in reversed(node.items))
+
+EVAL_DISPATCH = {
+    NumberNode: Evaluator._eval_num,
+    ArrayNode: Evaluator._eval_arr,
+    MapNode: Evaluator._eval_map,
+}
 
 # --------- Генерация TOML ---------
 
-def emit_inline_table(dct):
-    parts = []
-    for k, v in dct.items():
-        parts.append(f"{k} = {emit_value(v)}")
-    return "{ " + ", ".join(parts) + " }"
+# готовые строки для частых значений регистров 0x00..0xFF
+SMALL_INT_STR = [str(i) for i in range(256)]
+
+# общий для обоих путей перевода, чтобы числа печатались одинаково
+def int_str(x):
+    return SMALL_INT_STR[x] if 0 <= x < 256 else str(x)
+
+def _emit_int(x, stack, parts):
+    parts.append(int_str(x))
+
+SEP = (TEXT, ", ")
+CLOSE_ARRAY = (TEXT, "]")
+CLOSE_TABLE = (TEXT, " }")
+
+# Записи для стека готовятся заранее в списке нужной длины и кладутся одним
+# extend: сверху оказывается первый элемент, снизу — закрывающая скобка.
+
+def _emit_list(x, stack, parts):
+    parts.append("[")
+    n = len(x)
+    pending = [SEP] * (2 * n) if n else [None]
+    pending[0] = CLOSE_ARRAY
+    for j, item in enumerate(x):
+        pending[2 * (n - 1 - j) + 1] = (VISIT, item)
+    stack.extend(pending)
+
+def _emit_inline_table(x, stack, parts):
+    parts.append("{ ")
+    n = len(x)
+    pending = [SEP] * (3 * n) if n else [None]
+    pending[0] = CLOSE_TABLE
+    for j, (k, item) in enumerate(x.items()):
+        base = 3 * (n - 1 - j)
+        pending[base + 1] = (VISIT, item)
+        pending[base + 2] = (TEXT, f"{k} = ")
+    stack.extend(pending)
+
+def _emit_const(x, stack, parts):
+    parts.append(x.text)
+
+EMIT_DISPATCH = {
+    int: _emit_int,
+    list: _emit_list,
+    dict: _emit_inline_table,
+    _ConstStrRef: _emit_const,
+}
+
+def _emit(v, out):
+    # пишет фрагменты значения v в общий список out
+    stack = [(VISIT, v)]
+    while stack:
+        op, x = stack.pop()
+        if op == TEXT:
+            out.append(x)
+            continue
+        try:
+            handler = EMIT_DISPATCH[type(x)]
+        except KeyError:
+            raise ValueError(f"Неподдерживаемый TOML тип: {type(x)}") from None
+        handler(x, stack, out)
 
 def emit_value(v):
-    if isinstance(v, int):
-        return str(v)
-    if isinstance(v, list):
-        return "[" + ", ".join(emit_value(x) for x in v) + "]"
-    if isinstance(v, dict):
-        return emit_inline_table(v)
-    raise ValueError(f"Неподдерживаемый TOML тип: {type(v)}")
+    out = []
+    _emit(v, out)
+    return "".join(out)
 
 def emit_root(root):
+    if type(root) is _ConstStrRef:
+        root = root.value
+    out = []
     if isinstance(root, dict):
-        lines = []
         for k, v in root.items():
-            if isinstance(v, dict):
-                lines.append(f"{k} = {emit_inline_table(v)}")
-            else:
-                lines.append(f"{k} = {emit_value(v)}")
-        return ("\n".join(lines) + "\n") if lines else ""
+            out.append(f"{k} = ")
+            _emit(v, out)
+            out.append("\n")
     else:
-        return f"value = {emit_value(root)}\n"
+        out.append("value = ")
+        _emit(root, out)
+        out.append("\n")
+    return "".join(out)
+
+# --------- Потоковая трансляция (без AST) ---------
+
+class StreamTranslator(TokenReader):
+    # Разбирает токены и сразу пишет фрагменты TOML в общий список out.
+    # Ошибки констант откладываются до конца разбора, чтобы синтаксические
+    # ошибки, как и в пути через AST, сообщались первыми.
+
+    def __init__(self, tokens):
+        super().__init__(tokens)
+        self.consts = {}       # имя -> готовая строка TOML
+        self.const_items = {}  # имя -> {ключ: строка} для констант-словарей
+        self.error = None
+
+    def fail(self, message):
+        if self.error is None:
+            self.error = EvalError(message)
+
+    def translate(self):
+        out = []
+        while self.peek() == TokenKind.KW_VAR:
+            self.parse_const_decl()
+        kind = self.peek()
+        if kind == TokenKind.LBRACE:
+            self.parse_dict(out, root=True)
+        elif kind == TokenKind.QMARK:
+            self.emit_root_ref(out)
+        else:
+            out.append("value = ")
+            self.parse_value(out)
+            out.append("\n")
+        self.expect_EOF()
+        if self.error is not None:
+            raise self.error
+        return "".join(out)
+
+    def parse_const_decl(self):
+        self.expect_KW_VAR()
+        name = self.expect_IDENT()
+        self.expect_EQUAL()
+        duplicate = name in self.consts
+        if duplicate:
+            self.fail(f"Повторное объявление константы '{name}'")
+        out = []
+        items = self.parse_value(out, collect=True)
+        if not duplicate:
+            self.consts[name] = "".join(out)
+            self.const_items[name] = items
+
+    def parse_value(self, out, collect=False):
+        # возвращает {ключ: строка}, если значение — словарь и collect=True
+        kind = self.peek()
+        if kind == TokenKind.HEX:
+            out.append(int_str(self.advance()))
+            return None
+        if kind == TokenKind.KW_ARRAY:
+            self.parse_array(out)
+            return None
+        if kind == TokenKind.LBRACE:
+            return self.parse_dict(out, collect=collect)
+        if kind == TokenKind.QMARK:
+            name = self.parse_const_ref()
+            if name not in self.consts:
+                return None
+            out.append(self.consts[name])
+            return self.const_items[name]
+        i = self.i
+        raise ParseError(f"Ожидалось значение на {self.location(i)}, найдено '{kind}'")
+
+    def parse_array(self, out):
+        self.expect_KW_ARRAY()
+        self.expect_LPAREN()
+        out.append("[")
+        if self.peek() != TokenKind.RPAREN:
+            self.parse_value(out)
+            while self.peek() == TokenKind.COMMA:
+                self.advance()
+                out.append(", ")
+                self.parse_value(out)
+        self.expect_RPAREN()
+        out.append("]")
+
+    def parse_dict(self, out, collect=False, root=False):
+        # root=True: строки "ключ = значение" верхнего уровня вместо { ... }
+        start = len(out)
+        ranges = {}     # ключ -> (начало, конец) фрагментов значения в out
+        overrides = {}  # повторный ключ -> фрагменты последнего значения
+        self.expect_LBRACE()
+        if not root:
+            out.append("{ ")
+        while self.peek() != TokenKind.RBRACE:
+            key = self.expect_IDENT()
+            self.expect_EQUAL()
+            if key in ranges:
+                tmp = []
+                self.parse_value(tmp)
+                overrides[key] = tmp
+            else:
+                if ranges and not root:
+                    out.append(", ")
+                out.append(f"{key} = ")
+                value_start = len(out)
+                self.parse_value(out)
+                ranges[key] = (value_start, len(out))
+                if root:
+                    out.append("\n")
+            self.expect_SEMI()
+        self.expect_RBRACE()
+
+        items = None
+        if collect:
+            items = {
+                k: "".join(overrides[k] if k in overrides else out[a:b])
+                for k, (a, b) in ranges.items()
+            }
+        if overrides:
+            # повторный ключ сохраняет место первого вхождения, но значение последнего
+            tail = [] if root else ["{ "]
+            for j, (k, (a, b)) in enumerate(ranges.items()):
+                if j and not root:
+                    tail.append(", ")
+                tail.append(f"{k} = ")
+                tail.extend(overrides[k] if k in overrides else out[a:b])
+                if root:
+                    tail.append("\n")
+            out[start:] = tail
+        if not root:
+            out.append(" }")
+        return items
+
+    def parse_const_ref(self):
+        self.expect_QMARK()
+        self.expect_LBRACKET()
+        name = self.expect_IDENT()
+        self.expect_RBRACKET()
+        if name not in self.consts:
+            self.fail(f"Неизвестная константа '?[{name}]'")
+        return name
+
+    def emit_root_ref(self, out):
+        name = self.parse_const_ref()
+        if name not in self.consts:
+            return
+        items = self.const_items[name]
+        if items is None:
+            out.append(f"value = {self.consts[name]}\n")
+            return
+        for k, v in items.items():
+            out.append(f"{k} = {v}\n")
+
+# --------- Кэш результатов ---------
+
+# сколько последних записей хранить: старые вытесняются при записи новой
+CACHE_MAX_ENTRIES = 256
+
+def private_cache_dir():
+    # личный каталог кэша пользователя (права 0700); None, если ему нельзя доверять
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = Path(base) / "dzconfig"
+    try:
+        path.mkdir(mode=0o700, parents=True, exist_ok=True)
+        st = os.lstat(path)
+        if not stat.S_ISDIR(st.st_mode):
+            return None
+        if hasattr(os, "getuid"):
+            if st.st_uid != os.getuid():
+                return None
+            if st.st_mode & 0o077:
+                os.chmod(path, 0o700)
+    except OSError:
+        return None
+    return path
+
+def cache_path(raw, directory):
+    # ключ учитывает и вход, и исходный код транслятора: после правки программы
+    # старые записи перестают совпадать
+    h = hashlib.blake2b(raw, digest_size=8)
+    h.update(Path(__file__).read_bytes())
+    return directory / f"{h.hexdigest()}.toml"
+
+def load_cached(path):
+    try:
+        text = path.read_bytes().decode("utf-8")
+    except (OSError, UnicodeDecodeError):
+        return None
+    try:
+        os.utime(path)  # время использования: по нему выбираются записи для вытеснения
+    except OSError:
+        pass
+    return text
+
+def store_cached(path, text):
+    # кэш только ускоряет повторные запуски: ошибки записи игнорируются
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(text.encode("utf-8"))
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        return
+    evict_cached(path.parent)
+
+def evict_cached(directory):
+    # удаляет самые давно использованные записи сверх CACHE_MAX_ENTRIES
+    entries = []
+    for entry in directory.glob("*.toml"):
+        try:
+            entries.append((entry.stat().st_mtime_ns, entry))
+        except OSError:
+            pass
+    if len(entries) <= CACHE_MAX_ENTRIES:
+        return
+    entries.sort()
+    for _, entry in entries[:len(entries) - CACHE_MAX_ENTRIES]:
+        try:
+            entry.unlink()
+        except OSError:
+            pass
 
 # --------- CLI ---------
 
+def translate(src, keep_ast=False):
+    lx = Lexer(src)
+    tokens = lx.tokenize()
+    if not keep_ast:
+        return StreamTranslator(tokens).translate()
+    # отладочный путь: дерево разбора, свёртка констант, вычисление, генерация
+    ps = Parser(tokens)
+    prog = fold_consts(ps.parse_program())
+    ev = Evaluator()
+    root_val = ev.eval_program(prog)
+    return emit_root(root_val)
+
 def run_cli(argv=None):
     parser = argparse.ArgumentParser(
         description="Транслятор учебного конфигурационного языка в TOML"
     )
     parser.add_argument("-i", "--input", required=True, help="Путь к входному файлу")
     parser.add_argument("-o", "--output", required=True, help="Путь к выходному файлу")
+    parser.add_argument("--no-cache", action="store_true", help="Не использовать кэш результатов трансляции")
+    parser.add_argument("--keep-ast", action="store_true", help="Транслировать через построение AST (для отладки)")
     args = parser.parse_args(argv)
 
     try:
-        with open(args.input, "r", encoding="utf-8") as f:
-            src = f.read()
-    except OSError as e:
+        with open(args.input, "rb") as f:
+            raw = f.read()
+        # переводы строк как в текстовом режиме: \r\n и одиночный \r -> \n
+        src = raw.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+    except (OSError, UnicodeDecodeError) as e:
         print(f"Ошибка чтения входного файла: {e}", file=sys.stderr)
         return 2
 
+    # отладочный --keep-ast всегда проходит весь путь через AST, мимо кэша
+    cache_dir = None if args.no_cache or args.keep_ast else private_cache_dir()
     try:
-        lx = Lexer(src)
-        tokens = lx.tokenize()
-        ps = Parser(tokens)
-        prog = ps.parse_program()
-        ev = Evaluator()
-        root_val = ev.eval_program(prog)
-        toml_text = emit_root(root_val)
-    except (LexerError, ParseError) as e:
-        print(f"Синтаксическая ошибка: {e}", file=sys.stderr)
-        return 1
-    except EvalError as e:
-        print(f"Ошибка вычисления констант: {e}", file=sys.stderr)
-        return 1
-    except Exception as e:
-        print(f"Внутренняя ошибка: {e}", file=sys.stderr)
-        return 3
+        cache_file = cache_path(raw, cache_dir) if cache_dir else None
+    except OSError:
+        cache_file = None
+    toml_text = load_cached(cache_file) if cache_file else None
+    if toml_text is None:
+        try:
+            toml_text = translate(src, keep_ast=args.keep_ast)
+        except (LexerError, ParseError) as e:
+            print(f"Синтаксическая ошибка: {e}", file=sys.stderr)
+            return 1
+        except EvalError as e:
+            print(f"Ошибка вычисления констант: {e}", file=sys.stderr)
+            return 1
+        except Exception as e:
+            print(f"Внутренняя ошибка: {e}", file=sys.stderr)
+            return 3
+        if cache_file:
+            store_cached(cache_file, toml_text)
 
     try:
         with open(args.output, "w", encoding="utf-8") as f: